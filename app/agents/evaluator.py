@@ -1,35 +1,39 @@
 # app/agents/evaluator.py
-import json
 import re
+from typing import Optional
+from urllib.parse import urlsplit
+import numpy as np
 from app.state import ResearchState
-from app.gemini import generate_text
+from app.fastjson import dumps, loads
+from app.gemini import generate_text_many
 
-def evaluator_agent(state: ResearchState) -> ResearchState:
-    print(f"🧪 Evaluating {len(state.sources)} sources so far")
+# Sources per scoring prompt; small chunks keep each call short and are
+# scored concurrently, up to GEMINI_CONCURRENCY at a time
+SCORE_CHUNK_SIZE = 5
 
-    # Ensure list exists
-    if not state.sources:
-        return state
+# Unknown domains left over in batches this small get a default score
+# instead of a Gemini round-trip
+HEURISTIC_MAX_ITEMS = 2
+_UNKNOWN_DOMAIN_SCORE = 0.4
 
-    # Keep already-scored sources; only score new ones
-    to_score = []
-    kept = []
-    for i, src in enumerate(state.sources):
-        if isinstance(src, dict) and "score" in src:
-            kept.append(src)
-        else:
-            # minimal payload to reduce tokens
-            to_score.append({
-                "id": i,
-                "url": (src.get("url","") if isinstance(src, dict) else ""),
-                "snippet": ((src.get("content","") if isinstance(src, dict) else "")[:600]),
-            })
+# Static credibility table, matched on the registered domain (last 2-3 labels)
+_HIGH = frozenset({
+    "nih.gov", "cdc.gov", "who.int", "nature.com", "science.org", "thelancet.com",
+    "nejm.org", "bmj.com", "cell.com", "pnas.org", "sciencedirect.com",
+    "springer.com", "wiley.com", "ieee.org", "acm.org", "arxiv.org",
+    "europa.eu", "un.org", "worldbank.org", "oecd.org", "imf.org",
+})
+_MED = frozenset({
+    "wikipedia.org", "reuters.com", "apnews.com", "bbc.com", "bbc.co.uk",
+    "nytimes.com", "washingtonpost.com", "theguardian.com", "economist.com",
+    "ft.com", "wsj.com", "bloomberg.com", "npr.org", "statista.com",
+    "mckinsey.com", "pewresearch.org", "technologyreview.com",
+})
 
-    if not to_score:
-        state.sources = kept
-        return state
+# Strips accidental code fences if the model adds them
+_FENCE_RE = re.compile(r"^```(?:json)?|```$", re.IGNORECASE)
 
-    prompt = f"""
+_PROMPT_TEMPLATE = """
 You are scoring source credibility for a research assistant.
 For each item, return a JSON array of objects: [{{"id": <int>, "score": <float 0..1>}}, ...]
 Return ONLY valid JSON. No markdown, no explanation.
@@ -41,43 +45,119 @@ Scoring guide:
 - 0.0–0.2: spam, unverifiable, sensational, no sources
 
 Items:
-{json.dumps(to_score, ensure_ascii=False)}
+{items}
 """
 
-    raw = generate_text(prompt)
+def evaluator_agent(state: ResearchState) -> ResearchState:
+    print(f"🧪 Evaluating {len(state.urls)} sources so far")
 
-    # Parse JSON safely
-    try:
-        # strip accidental code fences if model adds them
-        raw_clean = re.sub(r"^```(?:json)?|```$", "", raw.strip(), flags=re.IGNORECASE).strip()
-        scores = json.loads(raw_clean)
-    except Exception as e:
-        # If parsing fails, assign a conservative default
-        for item in to_score:
-            # Find original source by id
-            src = state.sources[item["id"]]
-            if isinstance(src, dict):
-                src["score"] = 0.3
-                src["eval_error"] = f"JSON parse failed: {e}"
-                kept.append(src)
-        state.sources = kept
+    # Ensure list exists
+    if not state.urls:
+        return state
+
+    # Keep already-scored sources; only score new ones
+    to_score = [
+        # minimal payload to reduce tokens
+        {"id": i, "url": state.urls[i], "snippet": state.snippets[i]}
+        for i, score in enumerate(state.scores)
+        if score is None
+    ]
+
+    if not to_score:
+        return state
+
+    # Known domains are a table lookup; only the long tail goes to Gemini
+    unknown = []
+    for item in to_score:
+        score = _domain_score(item["url"])
+        if score is None:
+            unknown.append(item)
+        else:
+            state.scores[item["id"]] = score
+
+    if len(unknown) <= HEURISTIC_MAX_ITEMS:
+        for item in unknown:
+            state.scores[item["id"]] = _UNKNOWN_DOMAIN_SCORE
+    elif not _score_with_llm(state, unknown) and len(unknown) == len(to_score):
+        # Nothing could be parsed: keep everything rather than filter on defaults
         return state
 
-    score_map = {}
-    for obj in scores if isinstance(scores, list) else []:
+    # Filter, but don't wipe everything
+    all_scores = np.asarray(state.scores, dtype=np.float64)
+    keep_mask = all_scores >= 0.6
+    if keep_mask.any():
+        state.keep_sources(np.flatnonzero(keep_mask).tolist())
+    else:
+        state.keep_sources(np.argsort(-all_scores, kind="stable")[:3].tolist())
+    return state
+
+
+def _score_with_llm(state: ResearchState, to_score) -> bool:
+    """Score items with Gemini in place; False if no response could be parsed."""
+    # Score groups in parallel; smaller prompts also come back faster
+    chunks = [to_score[i:i + SCORE_CHUNK_SIZE] for i in range(0, len(to_score), SCORE_CHUNK_SIZE)]
+    # Unparseable replies are not cached, so a bad reply isn't replayed on later runs
+    raws = generate_text_many(
+        [_PROMPT_TEMPLATE.format(items=dumps(chunk)) for chunk in chunks],
+        validate=_is_valid_scores,
+    )
+
+    ids = []
+    raw_scores = []
+    failed = 0
+    for chunk, raw in zip(chunks, raws):
+        # Parse JSON safely
         try:
-            score_map[int(obj["id"])] = max(0.0, min(1.0, float(obj["score"])))
-        except Exception:
+            scores = _parse_scores(raw)
+        except Exception as e:
+            # If parsing fails, assign a conservative default
+            print(f"⚠️ Score JSON parse failed: {e}")
+            failed += 1
+            for item in chunk:
+                state.scores[item["id"]] = 0.3
             continue
 
+        for obj in scores if isinstance(scores, list) else []:
+            try:
+                sid, score = int(obj["id"]), float(obj["score"])
+            except Exception:
+                continue
+            ids.append(sid)
+            raw_scores.append(score)
+
+    # Clamp every score in one vectorized call
+    score_arr = np.fromiter(raw_scores, dtype=np.float64, count=len(raw_scores))
+    np.clip(score_arr, 0.0, 1.0, out=score_arr)
+    score_map = dict(zip(ids, score_arr.tolist()))
+
     # Attach scores back to sources
     for item in to_score:
-        src = state.sources[item["id"]]
-        if isinstance(src, dict):
-            src["score"] = score_map.get(item["id"], 0.3)
-            kept.append(src)
+        if state.scores[item["id"]] is None:
+            state.scores[item["id"]] = score_map.get(item["id"], 0.3)
 
-    # Filter, but don't wipe everything
-    filtered = [s for s in kept if s.get("score", 0) >= 0.6]
-    state.sources = filtered if filtered else sorted(kept, key=lambda s: s.get("score", 0), reverse=True)[:3]
-    return state
+    return failed < len(chunks)
+
+
+def _parse_scores(raw: str):
+    return loads(_FENCE_RE.sub("", raw.strip()).strip())
+
+
+def _is_valid_scores(raw: str) -> bool:
+    try:
+        return isinstance(_parse_scores(raw), list)
+    except Exception:
+        return False
+
+
+def _domain_score(url: str) -> Optional[float]:
+    """Credibility from the static domain table, or None if the domain is unknown."""
+    host = (urlsplit(url).hostname or "").lower()
+    if host.endswith((".gov", ".edu")):
+        return 0.9
+    labels = host.rsplit(".", 3)
+    for base in (".".join(labels[-2:]), ".".join(labels[-3:])):
+        if base in _HIGH:
+            return 0.9
+        if base in _MED:
+            return 0.7
+    return None
@@ -26,7 +26,8 @@ Example for "AI in healthcare":
 
     try:
         logger.info(f"Planning research for: {state.topic}")
-        output = generate_text(prompt)
+        # Paraphrased topics reuse an earlier plan via the semantic cache
+        output = generate_text(prompt, semantic_key=state.topic)
         
         # Parse the output
         steps = []
@@ -1,49 +1,118 @@
 # app/agents/searcher.py
 import os
-from app import state
-from tavily import TavilyClient
+import asyncio
+import threading
+import httpx
+from diskcache import Cache
 from app.state import ResearchState
+from app.concurrency import FANOUT_WORKERS, GIL_DISABLED, thread_map
 
-def search_agent(state: ResearchState) -> ResearchState:
+# Per-source truncation, applied once when a result is stored
+MAX_CONTENT_CHARS = 4000
+SNIPPET_CHARS = 600
+
+TAVILY_API_URL = "https://api.tavily.com"
+
+# Shared across plan steps and requests: one HTTP/2 connection multiplexes
+# the parallel plan queries, and the pool stays warm between requests
+_TAVILY_CLIENT = None
+_TAVILY_CLIENT_LOCK = threading.Lock()
+
+def _get_client() -> httpx.Client:
+    global _TAVILY_CLIENT
+    with _TAVILY_CLIENT_LOCK:
+        if _TAVILY_CLIENT is None:
+            api_key = os.getenv("TAVILY_API_KEY")
+            if not api_key:
+                raise EnvironmentError("Missing TAVILY_API_KEY")
+            _TAVILY_CLIENT = httpx.Client(
+                base_url=TAVILY_API_URL,
+                http2=True,
+                timeout=15.0,
+                headers={"Authorization": f"Bearer {api_key}"},
+            )
+    return _TAVILY_CLIENT
+
+# Identical queries across research runs return near-identical results,
+# so keep responses on disk for a day
+_TAVILY_CACHE = Cache(os.getenv("TAVILY_CACHE_DIR", ".cache/tavily"))
+TAVILY_CACHE_TTL = 24 * 60 * 60
+MAX_RESULTS = 5
+SEARCH_DEPTH = "basic"
+
+def _search(query: str) -> dict:
+    key = (query, MAX_RESULTS, SEARCH_DEPTH)
+    cached = _TAVILY_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    http_resp = _get_client().post("/search", json={
+        "query": query,
+        "max_results": MAX_RESULTS,
+        "search_depth": SEARCH_DEPTH,
+        "include_answer": False,
+        "include_raw_content": False,
+    })
+    http_resp.raise_for_status()
+    resp = http_resp.json()
+    _TAVILY_CACHE.set(key, resp, expire=TAVILY_CACHE_TTL)
+    return resp
+
+async def search_agent_async(state: ResearchState) -> ResearchState:
     # Stop if plan is done
     if state.current_step >= len(state.plan):
         return state
 
-    api_key = os.getenv("TAVILY_API_KEY")
-    if not api_key:
-        raise EnvironmentError("Missing TAVILY_API_KEY")
+    queries = state.plan[state.current_step:]
+    print(f"🔍 Searching steps {state.current_step + 1}-{len(state.plan)} of {len(state.plan)} in parallel")
+    # Fail the request on a missing key instead of letting gather swallow it per query
+    _get_client()
 
-    client = TavilyClient(api_key=api_key)
+    # Plan steps are independent, so fire every remaining query at once
+    tasks = [asyncio.to_thread(_search, q) for q in queries]
+    results_list = await asyncio.gather(*tasks, return_exceptions=True)
+    return _merge_results(state, queries, results_list)
 
-    query = state.plan[state.current_step]
-    print(f"🔍 Searching step {state.current_step + 1}/{len(state.plan)}: {query}")
+def search_agent(state: ResearchState) -> ResearchState:
+    # LangGraph node wrapper; nodes are invoked from sync FastAPI handlers
+    if state.current_step >= len(state.plan):
+        return state
+    if not GIL_DISABLED:
+        return asyncio.run(search_agent_async(state))
 
+    # Free-threaded build: plain worker threads, no event loop needed
+    queries = state.plan[state.current_step:]
+    print(f"🔍 Searching steps {state.current_step + 1}-{len(state.plan)} of {len(state.plan)} on {FANOUT_WORKERS} threads")
+    _get_client()
+    results_list = thread_map(_search, queries, return_exceptions=True)
+    return _merge_results(state, queries, results_list)
 
+def _merge_results(state: ResearchState, queries, results_list) -> ResearchState:
+    # One failed query is tolerated; all of them failing (bad key, outage) is an error
+    errors = [r for r in results_list if isinstance(r, Exception)]
+    if errors and len(errors) == len(results_list):
+        raise RuntimeError(f"All {len(errors)} searches failed: {errors[0]}") from errors[0]
 
-    resp = client.search(
-        query=query,
-        max_results=5,
-        search_depth="basic",
-        include_answer=False,
-        include_raw_content=False,
-    )
+    # Deduplicate by URL across the combined result set
+    seen = set(state.urls)
+    for query, resp in zip(queries, results_list):
+        if isinstance(resp, Exception):
+            print(f"⚠️ Search failed for '{query}': {resp}")
+            continue
 
-    results = resp.get("results", []) if isinstance(resp, dict) else []
+        try:
+            results = resp["results"]
+        except (KeyError, TypeError):
+            results = []
+        for r in results:
+            url = r.get("url")
+            content = r.get("content") or ""
+            if not url or url in seen:
+                continue
+            seen.add(url)
+            content = content[:MAX_CONTENT_CHARS]
+            state.add_source(url, content, content[:SNIPPET_CHARS], "tavily")
 
-    # Deduplicate by URL
-    seen = set(s.get("url") for s in state.sources if isinstance(s, dict))
-    for r in results:
-        url = r.get("url")
-        content = r.get("content") or ""
-        if not url or url in seen:
-            continue
-        seen.add(url)
-        state.sources.append({
-            "url": url,
-            "content": content[:4000],
-            "source_type": "tavily",
-        })
-
-    # ✅ CRITICAL: advance the loop
-    state.current_step += 1
+    # ✅ CRITICAL: the whole plan is searched in one pass
+    state.current_step = len(state.plan)
     return state
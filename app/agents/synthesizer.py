@@ -1,14 +1,20 @@
 from datetime import datetime
-from app.gemini import generate_text
+from langgraph.config import get_stream_writer
+from app.gemini import generate_text, generate_text_stream
 
-def synthesizer_agent(state):
+# Characters of each source's content included in the research notes
+NOTE_CHARS = 900
+
+def synthesizer_agent(state, config=None):
     # Support dict-based state (LangGraph) and object-based state (ResearchState)
     if isinstance(state, dict):
-        sources = state.get("sources") or []
+        urls = state.get("urls") or []
+        contents = state.get("contents") or []
         topic = state.get("topic", "")
         existing_report = state.get("report")
     else:
-        sources = getattr(state, "sources", None) or []
+        urls = getattr(state, "urls", None) or []
+        contents = getattr(state, "contents", None) or []
         topic = getattr(state, "topic", "")
         existing_report = getattr(state, "report", None)
 
@@ -16,16 +22,22 @@ def synthesizer_agent(state):
     if existing_report:
         return state
 
-    if not sources:
+    if not urls:
         msg = "No sources were retrieved. Check Tavily key/config or try a different query."
         return {"report": msg} if isinstance(state, dict) else _set_and_return(state, msg)
 
-    # Build notes
-    notes = "\n\n".join(
-        f"Source ({s.get('url','')}): {(s.get('content','') or '')[:900]}"
-        for s in sources
-        if isinstance(s, dict)
-    )
+    # Build notes in one join; sources without content have nothing to cite
+    parts = []
+    append = parts.append
+    for url, content in zip(urls, contents):
+        if not content:
+            continue
+        append("Source (")
+        append(url)
+        append("): ")
+        append(content[:NOTE_CHARS])
+        append("\n\n")
+    notes = "".join(parts)
 
     today = datetime.now().strftime("%B %d, %Y")
 
@@ -55,7 +67,17 @@ Research Notes:
 {notes}
 """
 
-    report_text = generate_text(prompt)
+    if (config or {}).get("configurable", {}).get("stream_report"):
+        # Forward chunks to graph.stream(..., stream_mode="custom") callers
+        writer = get_stream_writer()
+        chunks = []
+        for chunk in generate_text_stream(prompt):
+            chunks.append(chunk)
+            writer({"type": "delta", "text": chunk})
+        report_text = "".join(chunks)
+    else:
+        # Notes are unique per run, so caching the report would never hit
+        report_text = generate_text(prompt, use_cache=False)
 
     if isinstance(state, dict):
         return {"report": report_text}
@@ -0,0 +1,260 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+import functools
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # semantic layer is optional; the exact layer still works
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", ".cache/gemini_cache.sqlite")
+SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.88"))
+EMBEDDING_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "all-MiniLM-L6-v2")
+# Entries older than this are ignored and pruned; past MAX_ENTRIES the oldest go first
+CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(7 * 24 * 60 * 60)))
+MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(_normalize(text).encode("utf-8")).hexdigest()
+
+
+class SemanticCache:
+    """
+    Two-layer response cache for LLM prompts.
+
+    1. Exact layer: SHA-256 of the whitespace-normalized prompt.
+    2. Semantic layer: cosine similarity between embeddings of a caller-supplied
+       `semantic_key` (e.g. the research topic). Entries are grouped by the prompt
+       template (the prompt with the key blanked out) and embedding model, so a
+       paraphrased topic only matches a prompt built from the same scaffolding.
+       If the model can't be loaded or used, the semantic layer switches itself
+       off and only the exact layer is used.
+
+    Entries are persisted in SQLite and reloaded on startup. Entries older than
+    `ttl` seconds count as misses; the table is pruned back below `max_entries`
+    (oldest first) on startup and whenever it grows past the limit.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, threshold: float = SIMILARITY_THRESHOLD,
+                 model_name: str = EMBEDDING_MODEL, ttl: float = CACHE_TTL,
+                 max_entries: int = MAX_ENTRIES):
+        self.threshold = threshold
+        self.model_name = model_name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._model = None
+        self._semantic_disabled = False
+        self._model_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+        # hash -> (created, response)
+        self._exact: Dict[str, Tuple[float, str]] = {}
+        # template digest -> (float32 matrix of unit embeddings, created times, responses)
+        self._semantic: Dict[str, Tuple[np.ndarray, np.ndarray, List[str]]] = {}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "hash TEXT PRIMARY KEY, template TEXT, embedding BLOB, response TEXT, created REAL)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(entries)")}
+        if "created" not in columns:
+            # Tables from before entries expired; their rows get pruned as stale
+            self._db.execute("ALTER TABLE entries ADD COLUMN created REAL")
+        self._prune()
+
+    def _prune(self):
+        """Drop expired rows and the oldest beyond ~90% of max_entries, then reload."""
+        self._db.execute(
+            "DELETE FROM entries WHERE created IS NULL OR created < ?", (time.time() - self.ttl,)
+        )
+        self._db.execute(
+            "DELETE FROM entries WHERE hash NOT IN "
+            "(SELECT hash FROM entries ORDER BY created DESC LIMIT ?)",
+            (int(self.max_entries * 0.9),),
+        )
+        self._db.commit()
+        self._load()
+
+    def _load(self):
+        self._exact.clear()
+        self._semantic.clear()
+        rows = self._db.execute(
+            "SELECT hash, template, embedding, response, created FROM entries ORDER BY created"
+        ).fetchall()
+        vectors: Dict[str, List[np.ndarray]] = {}
+        created_at: Dict[str, List[float]] = {}
+        responses: Dict[str, List[str]] = {}
+        for h, template, blob, response, created in rows:
+            self._exact[h] = (created, response)
+            if template and blob:
+                vec = np.frombuffer(blob, dtype=np.float32)
+                group = vectors.setdefault(template, [])
+                if group and group[0].shape != vec.shape:
+                    continue  # written by a different embedding model
+                group.append(vec)
+                created_at.setdefault(template, []).append(created)
+                responses.setdefault(template, []).append(response)
+        for template, vecs in vectors.items():
+            self._semantic[template] = (
+                np.ascontiguousarray(np.vstack(vecs)),
+                np.asarray(created_at[template], dtype=np.float64),
+                responses[template],
+            )
+        logger.info(f"Semantic cache loaded {len(rows)} entries")
+
+    def embed(self, text: str) -> Optional[np.ndarray]:
+        """
+        Unit-normalized float32 embedding, or None if sentence-transformers is
+        unavailable or the model failed to load or encode.
+        """
+        model = self._get_model()
+        if model is None:
+            return None
+        try:
+            vec = model.encode(_normalize(text), normalize_embeddings=True)
+        except Exception as e:
+            self._disable_semantic(e)
+            return None
+        return np.asarray(vec, dtype=np.float32)
+
+    def _get_model(self):
+        # Loaded once under a lock: a cold batch would otherwise load it per thread
+        if self._model is None and SentenceTransformer is not None and not self._semantic_disabled:
+            with self._model_lock:
+                if self._model is None and not self._semantic_disabled:
+                    logger.info(f"Loading embedding model {self.model_name}")
+                    try:
+                        self._model = SentenceTransformer(self.model_name)
+                    except Exception as e:
+                        self._disable_semantic(e)
+        return self._model
+
+    def _disable_semantic(self, error: Exception):
+        # Don't retry a broken model on every call; the exact layer keeps working
+        logger.warning(f"Embedding model {self.model_name} unavailable, semantic cache disabled: {error}")
+        self._semantic_disabled = True
+        self._model = None
+
+    def _template(self, prompt: str, semantic_key: str) -> str:
+        blanked = prompt.replace(semantic_key, "\0")
+        return _digest(f"{self.model_name}\0{blanked}")
+
+    def get(self, prompt: str, semantic_key: Optional[str] = None) -> Optional[str]:
+        cutoff = time.time() - self.ttl
+        hit = self._exact.get(_digest(prompt))
+        if hit is not None and hit[0] >= cutoff:
+            return hit[1]
+        if not semantic_key:
+            return None
+
+        entry = self._semantic.get(self._template(prompt, semantic_key))
+        if entry is None:
+            return None
+        q_vec = self.embed(semantic_key)
+        if q_vec is None:
+            return None
+
+        index_matrix, created, responses = entry
+        if index_matrix.shape[1] != q_vec.shape[0]:
+            return None
+        sims = np.dot(index_matrix, q_vec)
+        sims[created < cutoff] = -np.inf
+        best = int(np.argmax(sims))
+        if sims[best] >= self.threshold:
+            logger.info(f"Semantic cache hit (similarity {sims[best]:.3f})")
+            return responses[best]
+        return None
+
+    def put(self, prompt: str, response: str, semantic_key: Optional[str] = None):
+        h = _digest(prompt)
+        template = None
+        q_vec = None
+        if semantic_key:
+            q_vec = self.embed(semantic_key)
+            if q_vec is not None:
+                template = self._template(prompt, semantic_key)
+
+        now = time.time()
+        with self._lock:
+            self._exact[h] = (now, response)
+            if q_vec is not None:
+                matrix, created, responses = self._semantic.get(
+                    template,
+                    (np.empty((0, q_vec.shape[0]), dtype=np.float32), np.empty(0, dtype=np.float64), []),
+                )
+                self._semantic[template] = (
+                    np.ascontiguousarray(np.vstack([matrix, q_vec])),
+                    np.append(created, now),
+                    responses + [response],
+                )
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (h, template, q_vec.tobytes() if q_vec is not None else None, response, now),
+            )
+            self._db.commit()
+            if len(self._exact) > self.max_entries:
+                self._prune()
+
+
+_cache: Optional[SemanticCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> SemanticCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache()
+    return _cache
+
+
+def semantic_cache(fn):
+    """
+    Decorator for `fn(prompt, ...) -> str` that serves repeated prompts from the cache.
+
+    Adds three keyword arguments to the wrapped function:
+        use_cache: Set False to always call through (e.g. one-off long prompts)
+        semantic_key: Part of the prompt to match by meaning rather than exact text
+        validate: Predicate a response must pass to be stored or served from cache
+    """
+    @functools.wraps(fn)
+    def wrapper(prompt: str, *args, use_cache: bool = True, semantic_key: Optional[str] = None,
+                validate: Optional[Callable[[str], bool]] = None, **kwargs):
+        if not use_cache:
+            return fn(prompt, *args, **kwargs)
+
+        # The cache is an optimization: any failure in it is a miss or a skipped store
+        try:
+            hit = get_cache().get(prompt, semantic_key)
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed: {e}")
+            hit = None
+        if hit is not None and (validate is None or validate(hit)):
+            logger.info("Serving Gemini response from cache")
+            return hit
+
+        text = fn(prompt, *args, **kwargs)
+        if text and (validate is None or validate(text)):
+            try:
+                get_cache().put(prompt, text, semantic_key)
+            except Exception as e:
+                logger.warning(f"Semantic cache store failed: {e}")
+        return text
+    return wrapper
@@ -0,0 +1,31 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List
+
+# Worker threads used for fan-out on free-threaded (no-GIL) interpreters
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "4"))
+
+
+def gil_disabled() -> bool:
+    """True on a CPython 3.13+ free-threaded build running with the GIL off."""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+GIL_DISABLED = gil_disabled()
+
+
+def thread_map(fn: Callable, items: Iterable, return_exceptions: bool = False,
+               max_workers: int = FANOUT_WORKERS) -> List:
+    """
+    Apply fn to each item on a thread pool, preserving order.
+    
+    With return_exceptions=True, an item whose call raised yields the exception
+    in its slot (like asyncio.gather) instead of propagating it.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(fn, item) for item in items]
+    if not return_exceptions:
+        return [f.result() for f in futures]
+    return [f.exception() or f.result() for f in futures]
@@ -0,0 +1,21 @@
+"""JSON helpers backed by orjson when it is installed, stdlib json otherwise."""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj) -> str:
+    """Serialize obj to a JSON str (non-ASCII characters are kept as-is)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def loads(data):
+    """Parse a JSON str or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
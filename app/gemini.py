@@ -1,9 +1,14 @@
 import os
+import asyncio
+import threading
+from typing import Iterator, List
 from google import genai
 from dotenv import load_dotenv
 import time
 from google.genai import errors
 import logging
+from app.cache import semantic_cache
+from app.concurrency import GIL_DISABLED, thread_map
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,13 +27,22 @@ client = genai.Client(api_key=key)
 # Use a more conservative model for rate limits
 MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-lite")
 
-# ✅ IMPROVEMENT: Track request timing to avoid rate limits
-_last_request_time = 0
-_min_request_interval = 2.0  # Minimum 2 seconds between requests
+# ✅ IMPROVEMENT: Cap in-flight requests instead of spacing them out,
+# so independent prompts can overlap without tripping rate limits
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "3"))
+_request_slots = threading.BoundedSemaphore(GEMINI_CONCURRENCY)
 
+RATE_LIMIT_MESSAGE = (
+    "Gemini API rate limit exceeded. Please wait a few minutes and try again. "
+    "Consider upgrading your API key or reducing request frequency."
+)
+
+@semantic_cache
 def generate_text(prompt: str, max_retries: int = 3) -> str:
     """
     Generate text with Gemini, with exponential backoff for rate limits.
+    Repeated prompts are served from the semantic cache (see app/cache.py);
+    pass use_cache=False to bypass it or semantic_key=... to match paraphrases.
     
     Args:
         prompt: The prompt to send to Gemini
@@ -41,28 +55,19 @@ def generate_text(prompt: str, max_retries: int = 3) -> str:
         RuntimeError: If rate limit retries are exhausted
         Exception: For other API errors
     """
-    global _last_request_time
-    
-    # ✅ Rate limit prevention: Wait between requests
-    time_since_last = time.time() - _last_request_time
-    if time_since_last < _min_request_interval:
-        wait_time = _min_request_interval - time_since_last
-        logger.info(f"Rate limit prevention: waiting {wait_time:.2f}s")
-        time.sleep(wait_time)
-    
     delay = 3.0  # Start with 3 second delay
     last_error = None
     
     for attempt in range(max_retries):
         try:
-            _last_request_time = time.time()
-            
             logger.info(f"Calling Gemini (attempt {attempt + 1}/{max_retries})...")
             
-            resp = client.models.generate_content(
-                model=MODEL,
-                contents=prompt,
-            )
+            # ✅ Rate limit prevention: at most GEMINI_CONCURRENCY calls in flight
+            with _request_slots:
+                resp = client.models.generate_content(
+                    model=MODEL,
+                    contents=prompt,
+                )
             
             logger.info("Gemini response received successfully")
             return resp.text
@@ -72,7 +77,7 @@ def generate_text(prompt: str, max_retries: int = 3) -> str:
             error_str = str(e)
             
             # Check for rate limit errors
-            if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str or "quota" in error_str.lower():
+            if _is_rate_limit_error(error_str):
                 logger.warning(f"Rate limit hit (attempt {attempt + 1}/{max_retries}). Waiting {delay}s...")
                 
                 if attempt < max_retries - 1:
@@ -82,10 +87,7 @@ def generate_text(prompt: str, max_retries: int = 3) -> str:
                 else:
                     # Last attempt failed
                     logger.error("Rate limit retries exhausted")
-                    raise RuntimeError(
-                        "Gemini API rate limit exceeded. Please wait a few minutes and try again. "
-                        "Consider upgrading your API key or reducing request frequency."
-                    ) from e
+                    raise RuntimeError(RATE_LIMIT_MESSAGE) from e
             
             # For other errors, log and re-raise
             logger.error(f"Gemini API error: {error_str}")
@@ -99,6 +101,97 @@ def generate_text(prompt: str, max_retries: int = 3) -> str:
     raise RuntimeError("Failed to generate text after retries") from last_error
 
 
+def generate_text_stream(prompt: str, max_retries: int = 3) -> Iterator[str]:
+    """
+    Stream generated text from Gemini chunk by chunk.
+    
+    Rate limits are retried with the same backoff as generate_text, but only
+    until the first chunk arrives; later errors propagate to the caller.
+    Streamed responses are not cached.
+    
+    Args:
+        prompt: The prompt to send to Gemini
+        max_retries: Maximum number of retry attempts
+        
+    Yields:
+        Text chunks as they are generated
+        
+    Raises:
+        RuntimeError: If rate limit retries are exhausted
+        Exception: For other API errors
+    """
+    delay = 3.0
+    
+    for attempt in range(max_retries):
+        started = False
+        try:
+            logger.info(f"Streaming from Gemini (attempt {attempt + 1}/{max_retries})...")
+            
+            with _request_slots:
+                for chunk in client.models.generate_content_stream(
+                    model=MODEL,
+                    contents=prompt,
+                ):
+                    if chunk.text:
+                        started = True
+                        yield chunk.text
+            
+            logger.info("Gemini stream completed successfully")
+            return
+        
+        except errors.ClientError as e:
+            error_str = str(e)
+            if started or not _is_rate_limit_error(error_str):
+                logger.error(f"Gemini API error: {error_str}")
+                raise
+            
+            logger.warning(f"Rate limit hit (attempt {attempt + 1}/{max_retries}). Waiting {delay}s...")
+            if attempt < max_retries - 1:
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+                continue
+            logger.error("Rate limit retries exhausted")
+            raise RuntimeError(RATE_LIMIT_MESSAGE) from e
+
+
+def _is_rate_limit_error(error_str: str) -> bool:
+    return "429" in error_str or "RESOURCE_EXHAUSTED" in error_str or "quota" in error_str.lower()
+
+
+async def generate_text_async(prompt: str, max_retries: int = 3, **cache_kwargs) -> str:
+    """Awaitable generate_text; runs the blocking call on a worker thread."""
+    return await asyncio.to_thread(generate_text, prompt, max_retries, **cache_kwargs)
+
+
+async def generate_text_many_async(prompts: List[str], max_retries: int = 3, **cache_kwargs) -> List[str]:
+    """
+    Generate text for several independent prompts concurrently.
+    
+    Each prompt goes through generate_text (cache, retries, backoff) on a worker
+    thread; the shared request slots keep at most GEMINI_CONCURRENCY in flight.
+    
+    Args:
+        prompts: The prompts to send to Gemini
+        max_retries: Maximum number of retry attempts per prompt
+        **cache_kwargs: Passed to every generate_text call (e.g. validate)
+        
+    Returns:
+        Generated text responses, in the same order as prompts
+    """
+    tasks = [generate_text_async(p, max_retries, **cache_kwargs) for p in prompts]
+    return list(await asyncio.gather(*tasks))
+
+
+def generate_text_many(prompts: List[str], max_retries: int = 3, **cache_kwargs) -> List[str]:
+    """
+    Sync wrapper around generate_text_many_async for LangGraph nodes.
+    On free-threaded builds the prompts run on plain worker threads instead.
+    """
+    if GIL_DISABLED:
+        return thread_map(lambda p: generate_text(p, max_retries, **cache_kwargs), prompts)
+    return asyncio.run(generate_text_many_async(prompts, max_retries, **cache_kwargs))
+
+
 def generate_text_with_fallback(prompt: str, fallback_response: str = None) -> str:
     """
     Generate text with a fallback response if rate limited.
@@ -6,9 +6,11 @@ from app.agents.evaluator import evaluator_agent
 from app.agents.synthesizer import synthesizer_agent
 
 def should_continue(state: ResearchState):
-    if state.current_step < len(state.plan):
-        return "search"
-    return "synthesize"
+    # The searcher covers every plan step in one pass, so once the plan is
+    # exhausted evaluate goes straight to synthesis
+    if state.current_step >= len(state.plan):
+        return "synthesize"
+    return "search"
 
 graph = StateGraph(ResearchState)
 
@@ -2,12 +2,25 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, JSONResponse
 from app.graph import research_graph
-from app.state import ResearchState
-import json
+from app.state import ResearchState, source_records
+from app.fastjson import dumps
+from app.cache import get_cache
+from app.concurrency import thread_map
+from concurrent.futures import Future
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+import numpy as np
+import os
+import threading
 import time
-import re
 import logging
 
+try:
+    # Linear-time DFA matcher; same API as `re` for the calls below
+    import re2 as re
+except ImportError:
+    import re
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -37,6 +50,68 @@ def linkify(text: str) -> str:
     return URL_RE.sub(repl, text)
 
 
+# Research runs in flight, keyed by normalized topic. Concurrent requests for
+# the same (or a semantically near-identical) topic wait on the first run
+# instead of starting their own pipeline.
+COALESCE_THRESHOLD = float(os.getenv("COALESCE_THRESHOLD", "0.9"))
+# key -> [embedding, or None until another request needs it, Future]
+_INFLIGHT: Dict[str, List] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+def _embed_topic(key: str) -> Optional[np.ndarray]:
+    """Topic embedding for semantic coalescing; None falls back to exact keys."""
+    try:
+        return get_cache().embed(key)
+    except Exception as e:
+        logger.warning(f"Topic embedding failed, coalescing on exact topic only: {e}")
+        return None
+
+def run_research_coalesced(topic: str) -> dict:
+    """Invoke the research graph for topic, sharing any matching in-flight run."""
+    key = " ".join(topic.lower().split())
+
+    # Embeddings only matter when another run is in flight; an idle server
+    # never loads the model. They're computed outside the lock.
+    with _INFLIGHT_LOCK:
+        compare = key not in _INFLIGHT and bool(_INFLIGHT)
+        unembedded = [(k, e) for k, e in _INFLIGHT.items() if e[0] is None] if compare else []
+    vec = _embed_topic(key) if compare else None
+    if vec is not None:
+        for other_key, other in unembedded:
+            other[0] = _embed_topic(other_key)
+
+    with _INFLIGHT_LOCK:
+        entry = _INFLIGHT.get(key)
+        if entry is None and vec is not None:
+            for other in _INFLIGHT.values():
+                if other[0] is not None and float(np.dot(other[0], vec)) >= COALESCE_THRESHOLD:
+                    entry = other
+                    break
+        if entry is not None:
+            future, owner = entry[1], False
+        else:
+            future, owner = Future(), True
+            _INFLIGHT[key] = [vec, future]
+
+    if not owner:
+        logger.info(f"Joining in-flight research for topic: {topic}")
+        return future.result()
+
+    try:
+        result = research_graph.invoke(
+            ResearchState(topic=topic).model_dump(),
+            {"recursion_limit": 30}
+        )
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(key, None)
+
+
 @app.get("/")
 def root():
     """Health check endpoint"""
@@ -73,16 +148,11 @@ def research(topic: str):
     logger.info(f"Starting research for topic: {topic}")
     
     try:
-        state = ResearchState(topic=topic)
-        
-        # Invoke the research graph
-        result = research_graph.invoke(
-            state.dict(), 
-            {"recursion_limit": 30}
-        )
+        # Invoke the research graph (or join a matching run already in flight)
+        result = run_research_coalesced(topic)
         
         report = linkify(result.get("report") or "")
-        sources = result.get("sources", []) or []
+        sources = source_records(result)
         
         logger.info(f"Research completed successfully. Sources: {len(sources)}")
         
@@ -142,13 +212,78 @@ def research(topic: str):
         )
 
 
+class BatchRequest(BaseModel):
+    topics: List[str]
+
+
+MAX_BATCH_TOPICS = 8
+
+
+@app.post("/research_batch")
+def research_batch(req: BatchRequest):
+    """
+    Research several topics in one call; topics run concurrently and identical
+    or near-identical ones share a single pipeline run.
+    
+    Args:
+        req: {"topics": [...]}, each topic 3-500 characters
+        
+    Returns:
+        JSON with one result per topic, in request order. Each result has
+        "success" and either "report"/"sources" or "error".
+        
+    Raises:
+        HTTPException: If the batch or any topic is invalid
+    """
+    # ✅ Input validation
+    if not req.topics or len(req.topics) > MAX_BATCH_TOPICS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch must contain 1-{MAX_BATCH_TOPICS} topics"
+        )
+    
+    for topic in req.topics:
+        if not topic or len(topic.strip()) < 3 or len(topic) > 500:
+            raise HTTPException(
+                status_code=400,
+                detail="Each topic must be 3-500 characters long"
+            )
+    
+    logger.info(f"Starting batch research for {len(req.topics)} topics")
+    
+    outcomes = thread_map(run_research_coalesced, req.topics, return_exceptions=True,
+                          max_workers=len(req.topics))
+    
+    results = []
+    for topic, outcome in zip(req.topics, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error(f"Batch research failed for topic {topic}: {outcome}")
+            if isinstance(outcome, RuntimeError) and "rate limit" in str(outcome).lower():
+                message = "Rate limit exceeded. Please wait and try again."
+            elif isinstance(outcome, RuntimeError):
+                message = str(outcome)
+            else:
+                message = "An unexpected error occurred. Please try again."
+            results.append({"success": False, "topic": topic, "error": message})
+            continue
+        
+        results.append({
+            "success": True,
+            "topic": topic,
+            "report": linkify(outcome.get("report") or ""),
+            "sources": source_records(outcome),
+        })
+    
+    return {"success": True, "results": results}
+
+
 @app.get("/research_stream")
 def research_stream(topic: str):
     """
     Streaming research endpoint with real-time progress updates.
     
     Args:
-        topic: Research topic
+        topic: Research topic (3-500 characters)
         
     Returns:
         Server-Sent Events stream
@@ -160,51 +295,64 @@ def research_stream(topic: str):
             content={"error": "Topic must be at least 3 characters long"}
         )
     
+    if len(topic) > 500:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Topic must be less than 500 characters"}
+        )
+    
     logger.info(f"Starting streaming research for topic: {topic}")
     
     def sse():
         try:
             # Initial event
-            yield f"data: {json.dumps({'type': 'status', 'message': 'Starting research...', 'progress': 0})}\n\n"
+            yield f"data: {dumps({'type': 'status', 'message': 'Starting research...', 'progress': 0})}\n\n"
             
-            state = ResearchState(topic=topic)
+            payload = ResearchState(topic=topic).model_dump()
+            last_state = payload
             
-            # Stream state updates as the graph runs
-            for update in research_graph.stream(
-                state.dict(), 
-                {"recursion_limit": 30}, 
-                stream_mode="values"
+            # Stream state updates as the graph runs, plus report chunks
+            # emitted by the synthesizer as they are generated
+            for mode, update in research_graph.stream(
+                payload, 
+                {"recursion_limit": 30, "configurable": {"stream_report": True}}, 
+                stream_mode=["values", "custom"]
             ):
+                if mode == "custom":
+                    yield f"data: {dumps(update)}\n\n"
+                    continue
+                
+                last_state = update
                 msg = update.get("status") or ""
                 prog = update.get("progress")
                 
-                payload = {
+                event = {
                     "type": "progress",
                     "message": msg,
                     "progress": prog if prog is not None else None,
                     "current_step": update.get("current_step"),
                     "total_steps": len(update.get("plan") or []),
                 }
-                yield f"data: {json.dumps(payload)}\n\n"
+                yield f"data: {dumps(event)}\n\n"
             
-            # Get final result
-            final = research_graph.invoke(state.dict(), {"recursion_limit": 30})
-            report = linkify(final.get("report") or "")
-            sources = final.get("sources", []) or []
+            # The last streamed values are the final state; re-invoking the
+            # graph here would run the whole pipeline a second time
+            report = linkify(last_state.get("report") or "")
+            sources = source_records(last_state)
             
-            yield f"data: {json.dumps({'type': 'final', 'report': report, 'sources': sources, 'progress': 1.0})}\n\n"
+            yield f"data: {dumps({'type': 'final', 'report': report, 'sources': sources, 'progress': 1.0})}\n\n"
             logger.info("Streaming research completed successfully")
         
         except RuntimeError as e:
             error_msg = str(e)
             if "rate limit" in error_msg.lower():
-                yield f"data: {json.dumps({'type': 'error', 'message': 'Rate limit exceeded. Please wait and try again.'})}\n\n"
+                yield f"data: {dumps({'type': 'error', 'message': 'Rate limit exceeded. Please wait and try again.'})}\n\n"
             else:
-                yield f"data: {json.dumps({'type': 'error', 'message': error_msg})}\n\n"
+                yield f"data: {dumps({'type': 'error', 'message': error_msg})}\n\n"
         
         except Exception as e:
             logger.error(f"Streaming error: {str(e)}", exc_info=True)
-            yield f"data: {json.dumps({'type': 'error', 'message': 'An error occurred during research'})}\n\n"
+            yield f"data: {dumps({'type': 'error', 'message': 'An error occurred during research'})}\n\n"
     
     return StreamingResponse(sse(), media_type="text/event-stream")
 
@@ -5,7 +5,42 @@ class ResearchState(BaseModel):
     topic: str
     plan: List[str] = []
     current_step: int = 0
-    sources: List[Dict] = []
+    # Sources are stored column-wise: row i is
+    # (urls[i], contents[i], snippets[i], scores[i], source_types[i])
+    urls: List[str] = []
+    contents: List[str] = []
+    snippets: List[str] = []  # short prefix of contents[i] sent to the evaluator
+    scores: List[Optional[float]] = []  # None until the evaluator scores the row
+    source_types: List[str] = []
     report: Optional[str] = None
     status: Optional[str] = None
     progress: Optional[float] = 0.0
+
+    def add_source(self, url: str, content: str, snippet: str, source_type: str) -> None:
+        """Append one source row, keeping every column in lockstep."""
+        self.urls.append(url)
+        self.contents.append(content)
+        self.snippets.append(snippet)
+        self.scores.append(None)
+        self.source_types.append(source_type)
+
+    def keep_sources(self, indices: List[int]) -> None:
+        """Keep only the given source rows, in the given order."""
+        self.urls = [self.urls[i] for i in indices]
+        self.contents = [self.contents[i] for i in indices]
+        self.snippets = [self.snippets[i] for i in indices]
+        self.scores = [self.scores[i] for i in indices]
+        self.source_types = [self.source_types[i] for i in indices]
+
+
+def source_records(values: Dict) -> List[Dict]:
+    """Rebuild per-source dicts from (graph) state values for API responses."""
+    return [
+        {"url": url, "content": content, "score": score, "source_type": source_type}
+        for url, content, score, source_type in zip(
+            values.get("urls") or [],
+            values.get("contents") or [],
+            values.get("scores") or [],
+            values.get("source_types") or [],
+        )
+    ]
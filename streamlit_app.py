@@ -1,12 +1,29 @@
 import streamlit as st
-import requests
+import hashlib
+import html
+import threading
+import httpx
 import time
-import json
+from collections import OrderedDict, deque
+from concurrent.futures import Future
 from datetime import datetime
-import io
+from typing import Optional
+import uuid
+
+from app.fastjson import loads
 
 # ==================== CONFIG ====================
 API_URL = "http://127.0.0.1:8000"
+HISTORY_PAGE = 10  # history entries rendered per sidebar page
+HISTORY_MAX = 50  # entries kept per session; the oldest is dropped beyond this
+HISTORY_SESSIONS = 200  # sessions with kept history; least recently used is dropped beyond this
+PREVIEW_CHARS = 200  # source content kept per card; the rest is dropped at ingest
+# (min score, css class, label), first match wins; resolved once per source at ingest
+_BUCKETS = (
+    (0.75, "score-high", "High Quality"),
+    (0.5, "score-medium", "Medium Quality"),
+    (float("-inf"), "score-low", "Low Quality"),
+)
 st.set_page_config(
     page_title="AutoResearcher AI",
     page_icon="🧠",
@@ -14,16 +31,224 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# ==================== API CLIENT ====================
+@st.cache_resource
+def _http() -> httpx.Client:
+    # Process-global, so every session and rerun reuses the keep-alive pool
+    return httpx.Client(
+        base_url=API_URL,
+        timeout=300,
+        limits=httpx.Limits(max_keepalive_connections=32),
+    )
+
+def _stream_research(topic: str, on_event) -> dict:
+    """
+    Run research through the SSE endpoint, calling on_event for each progress and
+    report-delta event as it arrives. Returns the final event (report + sources).
+    """
+    with _http().stream("GET", "/research_stream", params={"topic": topic}) as r:
+        if r.status_code != 200:
+            r.read()
+            r.raise_for_status()
+        for line in r.iter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = loads(line[len("data: "):])
+            if event["type"] == "final":
+                return event
+            if event["type"] == "error":
+                raise RuntimeError(event.get("message") or "Research failed")
+            on_event(event)
+    raise RuntimeError("Research stream ended without a result")
+
+# Example topics are collected for a short window (or until the batch is full)
+# and sent to /research_batch in one request
+BATCH_INTERVAL_S = 0.2
+MAX_BATCH_SIZE = 4
+
+@st.cache_resource
+def _topic_batcher():
+    return {"lock": threading.Lock(), "pending": [], "timer": None}
+
+def _submit_to_batch(topic: str) -> Future:
+    """Queue topic for the next /research_batch call; the Future gets its result."""
+    batcher = _topic_batcher()
+    future = Future()
+    batch = None
+    with batcher["lock"]:
+        batcher["pending"].append((topic, future))
+        if len(batcher["pending"]) >= MAX_BATCH_SIZE:
+            batch, batcher["pending"] = batcher["pending"], []
+            if batcher["timer"] is not None:
+                batcher["timer"].cancel()
+                batcher["timer"] = None
+        elif batcher["timer"] is None:
+            batcher["timer"] = threading.Timer(BATCH_INTERVAL_S, _flush_batch, args=(batcher,))
+            batcher["timer"].start()
+    if batch:
+        _send_batch(batch)
+    return future
+
+def _flush_batch(batcher):
+    with batcher["lock"]:
+        batch, batcher["pending"] = batcher["pending"], []
+        batcher["timer"] = None
+    if batch:
+        _send_batch(batch)
+
+def _send_batch(batch):
+    """POST the queued topics and map the N results back to the N futures by index."""
+    try:
+        r = _http().post(
+            "/research_batch",
+            json={"topics": [topic for topic, _ in batch]},
+            timeout=None,  # the whole batch completes before the response
+        )
+        r.raise_for_status()
+        for (_, future), result in zip(batch, loads(r.content)["results"]):
+            if result.get("success"):
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(result.get("error") or "Research failed"))
+    except Exception as e:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+
+RESULT_TTL_S = 3600  # finished results older than this are researched again
+
+def _topic_key(topic: str) -> str:
+    return hashlib.sha1(topic.strip().lower().encode()).hexdigest()
+
+@st.cache_data(persist="disk", max_entries=64, show_spinner=False)
+def _cached_research(topic_key: str, _result: Optional[dict] = None) -> dict:
+    """
+    Finished research results by topic key, shared by all sessions and persisted
+    to disk so repeat topics survive a server restart.
+    Called with just the key it is a lookup and raises LookupError on a miss
+    (exceptions are never cached); called with _result it stores that result,
+    stamped with the store time since persisted caches ignore ttl.
+    """
+    if _result is None:
+        raise LookupError(topic_key)
+    return {"stored_at": time.time(), "data": _result}
+
+@st.cache_resource
+def _inflight():
+    # topic key -> Future for research currently running in any session
+    return {"lock": threading.Lock(), "futures": {}}
+
+def _research(topic: str, on_event, batched: bool = False) -> dict:
+    """
+    Cached result for topic, else join an identical in-flight run, else start a
+    new one: streamed, or queued for /research_batch if batched.
+    """
+    key = _topic_key(topic)
+    try:
+        entry = _cached_research(key)
+        if time.time() - entry.get("stored_at", 0) < RESULT_TTL_S:
+            return entry["data"]
+        # Expired: drop it (memory and disk) so the fresh result can be stored
+        _cached_research.clear(key)
+    except LookupError:
+        pass
+    
+    inflight = _inflight()
+    with inflight["lock"]:
+        future = inflight["futures"].get(key)
+        owner = future is None
+        if owner:
+            future = inflight["futures"][key] = Future()
+    
+    if not owner:
+        on_event({"type": "progress", "message": "⏳ This topic is already being researched, waiting for it..."})
+        return future.result()
+    
+    try:
+        if batched:
+            on_event({"type": "progress", "message": "📦 Queued in a research batch..."})
+            data = _submit_to_batch(topic).result()
+        else:
+            data = _stream_research(topic, on_event)
+        # A run with no sources is usually a transient search failure; don't keep it
+        if data.get("sources"):
+            _cached_research(key, _result=data)
+        future.set_result(data)
+        return data
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    except BaseException:
+        # Streamlit's rerun/stop control flow (the owner clicked a widget mid-run)
+        # belongs to the owner's session only; waiters just see a failed run
+        future.set_exception(RuntimeError("Research was interrupted"))
+        raise
+    finally:
+        with inflight["lock"]:
+            inflight["futures"].pop(key, None)
+
 # ==================== SESSION STATE ====================
-if 'research_history' not in st.session_state:
-    st.session_state.research_history = []
+@st.cache_resource
+def _history_store():
+    # Process-global and mutable (not copied on read); one entry per session,
+    # in least- to most-recently-used order so idle sessions can be evicted
+    return {"lock": threading.Lock(), "sessions": OrderedDict()}
+
+def _session_history(session_key: str) -> dict:
+    """This session's history, created on first use; marks the session as recently used."""
+    store = _history_store()
+    with store["lock"]:
+        sessions = store["sessions"]
+        history = sessions.get(session_key)
+        if history is None:
+            history = sessions[session_key] = {"items": deque(maxlen=HISTORY_MAX), "total_sources": 0}
+            if len(sessions) > HISTORY_SESSIONS:
+                sessions.popitem(last=False)
+        else:
+            sessions.move_to_end(session_key)
+    return history
+
+# Stats are kept as running counters next to the items, so the sidebar never
+# re-sums history; these two helpers are the only writers
+def _record_research(history: dict, item: dict):
+    items = history["items"]
+    if len(items) == items.maxlen:
+        # The deque drops the oldest entry on append
+        history["total_sources"] -= len(items[0]['sources'])
+    items.append(item)
+    history["total_sources"] += len(item['sources'])
+
+def _clear_history(history: dict):
+    history["items"].clear()
+    history["total_sources"] = 0
+
+if 'session_key' not in st.session_state:
+    # History links reload the page; ?sid= reattaches it to its history
+    sid = st.query_params.get("sid")
+    st.session_state.session_key = sid if sid in _history_store()["sessions"] else uuid.uuid4().hex
+history = _session_history(st.session_state.session_key)
 if 'current_report' not in st.session_state:
     st.session_state.current_report = None
 if 'current_sources' not in st.session_state:
     st.session_state.current_sources = []
+if 'history_offset' not in st.session_state:
+    st.session_state.history_offset = 0
+
+# A clicked history link selects its entry once, then the param is dropped
+selected = st.query_params.get("history")
+if selected is not None:
+    del st.query_params["history"]
+    try:
+        item = history["items"][int(selected)]
+        st.session_state.current_report = item['report']
+        st.session_state.current_sources = item['sources']
+    except (ValueError, IndexError):
+        pass
 
 # ==================== CUSTOM CSS ====================
-st.markdown("""
+@st.cache_data(ttl=None)
+def _get_css() -> str:
+    return """
 <style>
     /* Main container */
     .main {
@@ -97,6 +322,12 @@ st.markdown("""
     }
     
     /* History item */
+    .history-list {
+        list-style: none;
+        padding: 0;
+        margin: 0;
+    }
+    
     .history-item {
         background: white;
         padding: 1rem;
@@ -112,6 +343,11 @@ st.markdown("""
         box-shadow: 0 2px 8px rgba(102,126,234,0.2);
     }
     
+    .history-item a {
+        color: inherit;
+        text-decoration: none;
+    }
+    
     /* Stats boxes */
     .stat-box {
         background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
@@ -132,15 +368,21 @@ st.markdown("""
         margin-top: 0.5rem;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(_get_css(), unsafe_allow_html=True)
 
 # ==================== HEADER ====================
-st.markdown("""
+@st.cache_data(ttl=None)
+def _get_header_html() -> str:
+    return """
 <div class="title-container">
     <h1 class="title-text">🧠 AutoResearcher AI</h1>
     <p class="subtitle-text">Agentic Research Assistant • Plan • Search • Evaluate • Synthesize</p>
 </div>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(_get_header_html(), unsafe_allow_html=True)
 
 # ==================== SIDEBAR ====================
 with st.sidebar:
@@ -168,21 +410,34 @@ with st.sidebar:
     # History section
     st.header("📚 Research History")
     
-    if st.session_state.research_history:
-        for idx, item in enumerate(reversed(st.session_state.research_history)):
-            with st.container():
-                if st.button(
-                    f"📄 {item['topic'][:30]}...",
-                    key=f"history_{idx}",
-                    use_container_width=True
-                ):
-                    st.session_state.current_report = item['report']
-                    st.session_state.current_sources = item['sources']
-                    st.rerun()
-                st.caption(f"🕐 {item['timestamp']}")
+    if history["items"]:
+        # Only render one page of the newest-first history
+        items = history["items"]
+        offset = min(st.session_state.history_offset, len(items) - 1)
+        end = len(items) - offset
+        # One HTML list of links instead of a button + caption per entry; the
+        # links carry the session key so the reloaded page finds this history
+        links = []
+        for i in range(end - 1, max(end - HISTORY_PAGE, 0) - 1, -1):
+            item = items[i]
+            links.append(
+                f'<li class="history-item"><a href="?sid={st.session_state.session_key}&history={i}" target="_self">'
+                f'📄 {html.escape(item["topic"][:30])}...</a><br><small>🕐 {item["timestamp"]}</small></li>'
+            )
+        st.markdown(f'<ul class="history-list">{"".join(links)}</ul>', unsafe_allow_html=True)
+        
+        if len(items) > HISTORY_PAGE:
+            newer_col, older_col = st.columns(2)
+            if newer_col.button("⏮️", key="history_newer", disabled=offset == 0, use_container_width=True):
+                st.session_state.history_offset = max(offset - HISTORY_PAGE, 0)
+                st.rerun()
+            if older_col.button("⏭️", key="history_older", disabled=end <= HISTORY_PAGE, use_container_width=True):
+                st.session_state.history_offset = offset + HISTORY_PAGE
+                st.rerun()
         
         if st.button("🗑️ Clear History", use_container_width=True):
-            st.session_state.research_history = []
+            _clear_history(history)
+            st.session_state.history_offset = 0
             st.rerun()
     else:
         st.info("No research history yet")
@@ -193,10 +448,9 @@ with st.sidebar:
     st.header("📊 Stats")
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("Total Researches", len(st.session_state.research_history))
+        st.metric("Total Researches", len(history["items"]))
     with col2:
-        total_sources = sum(len(item.get('sources', [])) for item in st.session_state.research_history)
-        st.metric("Sources Analyzed", total_sources)
+        st.metric("Sources Analyzed", history["total_sources"])
 
 # ==================== MAIN AREA ====================
 
@@ -212,6 +466,11 @@ with col2:
     run_button = st.button("🚀 Start Research", type="primary", use_container_width=True, disabled=not topic)
 
 # Example topics
+def _pick_example():
+    # Hand the choice over once and clear the radio so it doesn't re-trigger
+    st.session_state.example_topic = st.session_state.example_choice
+    st.session_state.example_choice = None
+
 with st.expander("💡 Example Topics"):
     examples = [
         "Impact of AI on healthcare diagnostics",
@@ -220,46 +479,68 @@ with st.expander("💡 Example Topics"):
         "Ethical implications of gene editing",
         "Future of renewable energy technologies"
     ]
-    cols = st.columns(len(examples))
-    for idx, example in enumerate(examples):
-        if cols[idx].button(example, key=f"example_{idx}", use_container_width=True):
-            st.session_state.example_topic = example
-            st.rerun()
+    st.radio(
+        "Examples",
+        examples,
+        index=None,
+        key="example_choice",
+        horizontal=True,
+        label_visibility="collapsed",
+        on_change=_pick_example,
+    )
 
-# Use example topic if set
-if 'example_topic' in st.session_state:
-    topic = st.session_state.example_topic
-    del st.session_state.example_topic
+# Use example topic if set; these go through the batch endpoint
+run_batched = False
+example_topic = st.session_state.pop('example_topic', None)
+if example_topic:
+    topic = example_topic
     run_button = True
+    run_batched = True
 
 # ==================== RESEARCH EXECUTION ====================
 if run_button and topic:
     # Progress tracking
     progress_bar = st.progress(0)
-    status_text = st.empty()
-    step_info = st.empty()
     
-    try:
-        status_text.info("🎯 Initializing research pipeline...")
+    with st.status("🎯 Researching...", expanded=True) as status:
+        step_info = st.empty()
+        report_preview = st.empty()
+        partial_report = []
         
-        # Call API
-        response = requests.post(
-            f"{API_URL}/research",
-            params={"topic": topic},
-            timeout=300
-        )
+        def on_event(event):
+            if event["type"] == "progress":
+                total = event.get("total_steps") or 0
+                done = event.get("current_step") or 0
+                # Planning ~10%, searching/evaluating up to 60%, synthesis after that
+                progress_bar.progress(0.1 + 0.5 * done / total if total else 0.05)
+                step_info.info(event.get("message") or "🎯 Initializing research pipeline...")
+            elif event["type"] == "delta":
+                if not partial_report:
+                    progress_bar.progress(0.8)
+                    step_info.info("✍️ Writing report...")
+                partial_report.append(event["text"])
+                report_preview.markdown("".join(partial_report))
         
-        if response.status_code == 200:
-            data = response.json()
+        try:
+            data = _research(topic, on_event, batched=run_batched)
             report = data.get("report", "")
-            sources = data.get("sources", [])
+            # Session state only keeps what the source cards render
+            sources = []
+            for s in data.get("sources", []):
+                score = s.get('score') or 0
+                sources.append({
+                    'url': s.get('url'),
+                    'score': score,
+                    'preview': (s.get('content') or 'No content preview')[:PREVIEW_CHARS],
+                    '_bucket': next(b for b in _BUCKETS if score >= b[0]),
+                })
             
             # Update session state
             st.session_state.current_report = report
             st.session_state.current_sources = sources
             
             # Add to history
-            st.session_state.research_history.append({
+            _record_research(history, {
                 'topic': topic,
                 'report': report,
                 'sources': sources,
@@ -267,32 +548,42 @@ if run_button and topic:
             })
             
             progress_bar.progress(100)
-            status_text.success("✅ Research completed successfully!")
-            time.sleep(1)
-            st.rerun()
+            status.update(label="✅ Research completed successfully!", state="complete", expanded=False)
+            # No rerun: the results block below renders in this same run, and the
+            # sidebar picks up the new history entry on the next interaction
             
-        else:
-            st.error(f"❌ API Error: {response.status_code}")
-            st.code(response.text)
-            
-    except requests.exceptions.RequestException as e:
-        st.error("❌ Could not connect to backend. Make sure the API is running.")
-        st.code(str(e))
+        except httpx.HTTPStatusError as e:
+            status.update(label="❌ Research failed", state="error")
+            st.error(f"❌ API Error: {e.response.status_code}")
+            st.code(e.response.text)
+        
+        except httpx.HTTPError as e:
+            status.update(label="❌ Research failed", state="error")
+            st.error("❌ Could not connect to backend. Make sure the API is running.")
+            st.code(str(e))
+        
+        except RuntimeError as e:
+            status.update(label="❌ Research failed", state="error")
+            st.error(f"❌ {e}")
 
 # ==================== DISPLAY RESULTS ====================
-if st.session_state.current_report:
+@st.fragment
+def _render_results():
+    """Report actions and tabs; widgets in here rerun only this fragment."""
     st.markdown("---")
     
     # Action buttons
+    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+    # Encoded once and shared by both download buttons
+    report_bytes = st.session_state.current_report.encode("utf-8")
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         # Download as Markdown
-        md_bytes = st.session_state.current_report.encode()
         st.download_button(
             "📥 Download MD",
-            data=md_bytes,
-            file_name=f"research_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
+            data=report_bytes,
+            file_name=f"research_{ts}.md",
             mime="text/markdown",
             use_container_width=True
         )
@@ -301,8 +592,8 @@ if st.session_state.current_report:
         # Download as TXT
         st.download_button(
             "📄 Download TXT",
-            data=st.session_state.current_report,
-            file_name=f"research_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+            data=report_bytes,
+            file_name=f"research_{ts}.txt",
             mime="text/plain",
             use_container_width=True
         )
@@ -330,21 +621,12 @@ if st.session_state.current_report:
         if st.session_state.current_sources:
             st.subheader(f"📚 {len(st.session_state.current_sources)} Sources Analyzed")
             
+            # One markdown call for every card instead of one per source
+            chunks = []
             for idx, source in enumerate(st.session_state.current_sources, 1):
-                score = source.get('score', 0)
-                
-                # Determine score class
-                if score >= 0.75:
-                    score_class = "score-high"
-                    score_label = "High Quality"
-                elif score >= 0.5:
-                    score_class = "score-medium"
-                    score_label = "Medium Quality"
-                else:
-                    score_class = "score-low"
-                    score_label = "Low Quality"
-                
-                st.markdown(f"""
+                _, score_class, score_label = source['_bucket']
+                score = source['score']
+                chunks.append(f"""
                 <div class="source-card">
                     <div style="display: flex; justify-content: space-between; align-items: center;">
                         <strong>Source {idx}</strong>
@@ -356,13 +638,17 @@ if st.session_state.current_report:
                         </a>
                     </div>
                     <div style="margin-top: 0.5rem; color: #6c757d; font-size: 0.9rem;">
-                        {source.get('content', 'No content preview')[:200]}...
+                        {source.get('preview') or 'No content preview'}...
                     </div>
                 </div>
-                """, unsafe_allow_html=True)
+                """)
+            st.markdown("".join(chunks), unsafe_allow_html=True)
         else:
             st.info("No sources available")
 
+if st.session_state.current_report:
+    _render_results()
+
 # ==================== FOOTER ====================
 st.markdown("---")
 st.markdown("""